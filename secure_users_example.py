@@ -4,34 +4,173 @@ Demonstrates authentication and account management operations.
 """
 
 import zmq
-import json
+import orjson
+import os
+import sys
 import time
 from typing import Dict, Any, Optional
 
+# Must match IPC_SOCKET_NAME in secure_users_service.py
+IPC_SOCKET_NAME = "secure_users_{port}.sock"
+
+# Readiness probe payload, encoded once
+HEALTH_CHECK_REQUEST = orjson.dumps({'action': 'health_check'})
+
+
+def ipc_socket_path(port: int) -> Optional[str]:
+    """
+    Return the IPC socket path for a port inside the user's private runtime directory.
+
+    Args:
+        port: Service TCP port the socket name is derived from
+
+    Returns:
+        Socket path, or None if there is no private runtime directory
+    """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if not runtime_dir or sys.platform == 'win32':
+        return None
+    try:
+        info = os.stat(runtime_dir)
+    except OSError:
+        return None
+    # Other local users must not be able to bind or replace the socket
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        return None
+    return os.path.join(runtime_dir, IPC_SOCKET_NAME.format(port=port))
+
+
+def service_endpoint(port: int, prefer_ipc: bool = False) -> str:
+    """Return the IPC endpoint if requested and the local service exposes one, else TCP."""
+    ipc_path = ipc_socket_path(port) if prefer_ipc else None
+    if ipc_path and os.path.exists(ipc_path):
+        return f"ipc://{ipc_path}"
+    return f"tcp://localhost:{port}"
+
 
 class SecureUsersClient:
     """Client for the Secure Users Service with authentication."""
 
-    def __init__(self, port: int = 5556):
-        """Initialize the client."""
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REQ)
-        self.socket.connect(f"tcp://localhost:{port}")
+    def __init__(self, port: int = 5556, verbose: bool = False, timeout_ms: int = 5000,
+                 use_ipc: bool = False):
+        """
+        Initialize the client.
+
+        Args:
+            port: Service port
+            verbose: Print every request and pretty-printed response
+            timeout_ms: How long to wait for each reply
+            use_ipc: Connect over the service's private IPC socket when it exists
+        """
+        self.port = port
+        self.verbose = verbose
+        self.timeout_ms = timeout_ms
+        # Share one context (and its IO thread) across all clients in the process
+        self.context = zmq.Context.instance()
+        self.socket = None
+        self.poller = None
+        self._connect(service_endpoint(port, prefer_ipc=use_ipc))
         self.session_token = None
-        print(f"Connected to Secure Users Service on port {port}")
+        print(f"Connected to Secure Users Service at {self.endpoint}")
+
+    def _connect(self, endpoint: str):
+        """(Re)create the REQ socket and connect it to the given endpoint."""
+        if self.socket:
+            self.socket.close()
+
+        self.socket = self.context.socket(zmq.REQ)
+        # Relaxed, correlated REQ: a timed-out request does not wedge the socket
+        self.socket.setsockopt(zmq.REQ_RELAXED, 1)
+        self.socket.setsockopt(zmq.REQ_CORRELATE, 1)
+        # Only queue requests on a live connection, and drop unsent ones on close
+        self.socket.setsockopt(zmq.IMMEDIATE, 1)
+        self.socket.setsockopt(zmq.SNDTIMEO, self.timeout_ms)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.endpoint = endpoint
+        self.socket.connect(endpoint)
+        self.poller = zmq.Poller()
+        self.poller.register(self.socket, zmq.POLLIN)
+
+    def wait_until_ready(self, attempts: int = 20, timeout_ms: int = 100) -> bool:
+        """
+        Poll the service with health checks until it answers.
+
+        Args:
+            attempts: Maximum number of probes
+            timeout_ms: How long each probe waits for a reply
+
+        Returns:
+            True if the service answered, False otherwise
+        """
+        if self._probe(attempts, timeout_ms):
+            return True
+
+        # A leftover socket file from a service that is gone makes IPC look
+        # available; retry over TCP
+        if self.endpoint.startswith('ipc://'):
+            self._connect(service_endpoint(self.port))
+            print(f"IPC endpoint not answering, retrying at {self.endpoint}")
+            return self._probe(attempts, timeout_ms)
+
+        return False
+
+    def _probe(self, attempts: int, timeout_ms: int) -> bool:
+        """Send health checks over the current socket until one is answered."""
+        # Probe over the client's own connection; the relaxed REQ socket can
+        # send again after an unanswered probe, so no throwaway sockets are needed
+        for _ in range(attempts):
+            try:
+                self.socket.send(HEALTH_CHECK_REQUEST, zmq.NOBLOCK)
+            except zmq.Again:
+                # No live connection yet (ZMQ_IMMEDIATE)
+                time.sleep(timeout_ms / 1000)
+                continue
+
+            if self.poller.poll(timeout_ms):
+                try:
+                    if orjson.loads(self.socket.recv(zmq.NOBLOCK)).get('status') == 'healthy':
+                        return True
+                except zmq.Again:
+                    # Stale reply to an earlier probe, dropped by REQ_CORRELATE
+                    pass
+
+        return False
 
     def _send_request(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
         """Send request and receive response."""
-        request_json = json.dumps(request_data)
-        print(f"\n📤 Request: {request_json[:100]}...")
-        self.socket.send_string(request_json)
-
-        response_json = self.socket.recv_string()
-        response_data = json.loads(response_json)
-        print(f"📥 Response: {json.dumps(response_data, indent=2)[:300]}...")
+        request_json = orjson.dumps(request_data)
+        if self.verbose:
+            print(f"\n📤 Request: {request_json[:100].decode(errors='replace')}...")
+        try:
+            self.socket.send(request_json)
+        except zmq.Again:
+            raise TimeoutError(f"Could not reach service within {self.timeout_ms} ms")
+
+        response_json = self._recv()
+        response_data = orjson.loads(response_json)
+        if self.verbose:
+            print(f"📥 Response: {orjson.dumps(response_data, option=orjson.OPT_INDENT_2).decode()[:300]}...")
 
         return response_data
 
+    def _recv(self) -> bytes:
+        """Receive a reply, polling only if it has not already arrived."""
+        try:
+            return self.socket.recv(zmq.NOBLOCK)
+        except zmq.Again:
+            pass
+
+        deadline = time.monotonic() + self.timeout_ms / 1000
+        while True:
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0 or not self.poller.poll(remaining_ms):
+                raise TimeoutError(f"No reply from service within {self.timeout_ms} ms")
+            try:
+                return self.socket.recv(zmq.NOBLOCK)
+            except zmq.Again:
+                # The readable message was a stale reply dropped by REQ_CORRELATE
+                continue
+
     def create_account(self, username: str, email: str, password: str, **kwargs) -> Dict[str, Any]:
         """
         Create a new user account.
@@ -226,11 +365,14 @@ class SecureUsersClient:
 
     def close(self):
         """Close the client connection."""
-        if self.session_token:
-            self.logout()
-
-        self.socket.close()
-        self.context.term()
+        try:
+            if self.session_token:
+                self.logout()
+        except TimeoutError as e:
+            print(f"⚠️ Logout skipped: {e}")
+        finally:
+            # The shared context stays alive for other clients in this process
+            self.socket.close()
         print("Client connection closed")
 
 
@@ -240,9 +382,17 @@ def main():
     print("Secure Users Service - Example Client")
     print("=" * 70)
 
-    client = SecureUsersClient(port=5556)
+    # Request/response dumps are opt-in: -v or SECURE_USERS_VERBOSE=1
+    verbose = '-v' in sys.argv[1:] or bool(os.environ.get('SECURE_USERS_VERBOSE'))
+    # So is IPC: --ipc or SECURE_USERS_IPC=1
+    use_ipc = '--ipc' in sys.argv[1:] or bool(os.environ.get('SECURE_USERS_IPC'))
+    client = SecureUsersClient(port=5556, verbose=verbose, use_ipc=use_ipc)
 
     try:
+        if not client.wait_until_ready():
+            print("❌ Secure Users Service is not responding")
+            return
+
         # 1. Create a new account
         print("\n1. CREATE NEW ACCOUNT")
         print("-" * 40)
@@ -262,8 +412,6 @@ def main():
         else:
             print(f"⚠️ {result.get('message')}")
 
-        time.sleep(1)
-
         # 2. Login with the new account
         print("\n2. LOGIN")
         print("-" * 40)
@@ -271,8 +419,6 @@ def main():
         if client.login("testuser", "Test123!"):
             print("✅ Login successful")
 
-        time.sleep(1)
-
         # 3. Get profile information
         print("\n3. GET PROFILE")
         print("-" * 40)
@@ -286,8 +432,6 @@ def main():
             print(f"  Role: {profile.get('role', 'user')}")
             print(f"  Status: {profile.get('status', 'unknown')}")
 
-        time.sleep(1)
-
         # 4. Update username
         print("\n4. UPDATE USERNAME")
         print("-" * 40)
@@ -295,8 +439,6 @@ def main():
         if client.update_username("testuser_updated"):
             print("✅ Username updated successfully")
 
-        time.sleep(1)
-
         # 5. Update email
         print("\n5. UPDATE EMAIL")
         print("-" * 40)
@@ -304,8 +446,6 @@ def main():
         if client.update_email("newemail@example.com"):
             print("✅ Email updated successfully")
 
-        time.sleep(1)
-
         # 6. Update password
         print("\n6. UPDATE PASSWORD")
         print("-" * 40)
@@ -313,8 +453,6 @@ def main():
         if client.update_password("Test123!", "NewPass456!"):
             print("✅ Password updated successfully")
 
-        time.sleep(1)
-
         # 7. Update profile fields
         print("\n7. UPDATE PROFILE")
         print("-" * 40)
@@ -327,8 +465,6 @@ def main():
         ):
             print("✅ Profile updated successfully")
 
-        time.sleep(1)
-
         # 8. Get updated profile
         print("\n8. GET UPDATED PROFILE")
         print("-" * 40)
@@ -342,8 +478,6 @@ def main():
             print(f"  Phone: {profile.get('phone', 'N/A')}")
             print(f"  City: {profile.get('city', 'N/A')}")
 
-        time.sleep(1)
-
         # 9. List users
         print("\n9. LIST USERS")
         print("-" * 40)
@@ -354,8 +488,6 @@ def main():
             for user in users[:5]:  # Show first 5
                 print(f"  - {user.get('username')} ({user.get('role', 'user')})")
 
-        time.sleep(1)
-
         # 10. Logout
         print("\n10. LOGOUT")
         print("-" * 40)
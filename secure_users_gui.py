@@ -6,17 +6,45 @@ A graphical interface for managing user accounts with login functionality.
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import zmq
-import json
-import threading
+import orjson
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
 import queue
 from typing import Optional
 
+# Must match IPC_SOCKET_NAME in secure_users_service.py
+IPC_SOCKET_NAME = "secure_users_{port}.sock"
+
+
+def ipc_socket_path(port: int) -> Optional[str]:
+    """
+    Return the IPC socket path for a port inside the user's private runtime directory.
+    
+    Args:
+        port: Service TCP port the socket name is derived from
+        
+    Returns:
+        Socket path, or None if there is no private runtime directory
+    """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if not runtime_dir or sys.platform == 'win32':
+        return None
+    try:
+        info = os.stat(runtime_dir)
+    except OSError:
+        return None
+    # Other local users must not be able to bind or replace the socket
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        return None
+    return os.path.join(runtime_dir, IPC_SOCKET_NAME.format(port=port))
+
 
 class SecureUsersGUI:
     """GUI client for the Secure Users Service with authentication."""
     
-    def __init__(self, root):
+    def __init__(self, root, use_ipc=False):
         """Initialize the GUI."""
         self.root = root
         self.root.title("Secure Users Management System")
@@ -26,11 +54,14 @@ class SecureUsersGUI:
         style = ttk.Style()
         style.theme_use('clam')
         
-        # ZMQ setup
-        self.context = zmq.Context()
+        # ZMQ setup (process-wide shared context)
+        self.context = zmq.Context.instance()
         self.socket = None
+        self.socket_uses_ipc = False
+        self.spare_socket = None
         self.connected = False
         self.port = 5556
+        self.use_ipc = use_ipc
         
         # Authentication state
         self.session_token = None
@@ -39,6 +70,17 @@ class SecureUsersGUI:
         # Message queue for thread-safe GUI updates
         self.message_queue = queue.Queue()
         
+        # Single long-lived request thread; ZMQ sockets are not thread-safe,
+        # so all socket IO happens here, one request at a time
+        self.request_executor = ThreadPoolExecutor(max_workers=1,
+                                                   thread_name_prefix="users-request")
+        
+        # Queue polling interval in ms; stays short while requests are in
+        # flight and backs off when idle
+        self.poll_interval = 100
+        self.poll_job = None
+        self.requests_in_flight = 0
+        
         # Create main container
         self.main_container = ttk.Frame(self.root)
         self.main_container.pack(fill=tk.BOTH, expand=True)
@@ -52,33 +94,63 @@ class SecureUsersGUI:
         # Auto-connect on startup
         self.root.after(100, self.auto_connect)
     
+    def service_endpoint(self, prefer_ipc=True):
+        """Return the IPC endpoint if enabled and the local service exposes one, else TCP."""
+        ipc_path = ipc_socket_path(self.port) if prefer_ipc and self.use_ipc else None
+        if ipc_path and os.path.exists(ipc_path):
+            return f"ipc://{ipc_path}"
+        return f"tcp://localhost:{self.port}"
+    
+    def create_socket(self, endpoint):
+        """Create a REQ socket connected to the service."""
+        socket = self.context.socket(zmq.REQ)
+        socket.setsockopt(zmq.RCVTIMEO, 5000)
+        # Only queue requests on a live connection (a send with no peer times
+        # out instead of waiting), and drop unsent messages on close
+        socket.setsockopt(zmq.IMMEDIATE, 1)
+        socket.setsockopt(zmq.SNDTIMEO, 5000)
+        socket.setsockopt(zmq.LINGER, 0)
+        # Relaxed REQ can send again after a timed-out request; correlation
+        # ids make it drop the late reply to that request
+        socket.setsockopt(zmq.REQ_RELAXED, 1)
+        socket.setsockopt(zmq.REQ_CORRELATE, 1)
+        socket.connect(endpoint)
+        return socket
+    
     def auto_connect(self):
         """Auto-connect to service on startup."""
         try:
-            self.socket = self.context.socket(zmq.REQ)
-            self.socket.setsockopt(zmq.RCVTIMEO, 5000)
-            self.socket.connect(f"tcp://localhost:{self.port}")
+            endpoint = self.service_endpoint()
+            self.socket = self.create_socket(endpoint)
+            self.socket_uses_ipc = endpoint.startswith('ipc://')
+            # Pre-connect a TCP fallback in case the IPC endpoint is stale
+            self.spare_socket = self.create_socket(self.service_endpoint(prefer_ipc=False))
             self.connected = True
             self.add_log("Connected to Secure Users Service", "success")
         except Exception as e:
             self.add_log(f"Connection failed: {str(e)}", "error")
     
     def reconnect(self):
-        """Reconnect to the service (reset socket)."""
+        """Reconnect to the service over TCP (reset socket)."""
+        # Socket lifecycle stays on the request thread, which may be using
+        # the current socket right now; the swap runs after that request
+        self.request_executor.submit(self.swap_to_spare_socket)
+    
+    def swap_to_spare_socket(self):
+        """Replace the current socket with the TCP spare (request thread only)."""
         try:
             # Close existing socket if any
             if self.socket:
                 self.socket.close()
             
-            # Create new socket
-            self.socket = self.context.socket(zmq.REQ)
-            self.socket.setsockopt(zmq.RCVTIMEO, 5000)
-            self.socket.connect(f"tcp://localhost:{self.port}")
-            self.connected = True
-            self.add_log("Reconnected to service", "success")
+            # Swap in the pre-connected spare and prepare the next one
+            tcp_endpoint = self.service_endpoint(prefer_ipc=False)
+            self.socket = self.spare_socket or self.create_socket(tcp_endpoint)
+            self.socket_uses_ipc = False
+            self.spare_socket = self.create_socket(tcp_endpoint)
+            self.message_queue.put(('reconnected', None, None))
         except Exception as e:
-            self.connected = False
-            self.add_log(f"Reconnection failed: {str(e)}", "error")
+            self.message_queue.put(('reconnect_failed', f"Reconnection failed: {str(e)}", None))
     
     def clear_container(self):
         """Clear all widgets from main container."""
@@ -660,9 +732,8 @@ All your data will be permanently deleted.
         
         def callback(response):
             if response['status'] == 'success':
-                # Clear tree
-                for item in self.users_tree.get_children():
-                    self.users_tree.delete(item)
+                # Clear tree in a single Tk call
+                self.users_tree.delete(*self.users_tree.get_children())
                 
                 # Add users
                 for user in response['users']:
@@ -717,42 +788,77 @@ All your data will be permanently deleted.
         
         def worker():
             try:
-                request_json = json.dumps(request_data)
-                self.socket.send_string(request_json)
-                response_json = self.socket.recv_string()
-                response_data = json.loads(response_json)
+                self.socket.send(orjson.dumps(request_data))
+                response_data = orjson.loads(self.socket.recv())
                 
                 self.message_queue.put(('response', response_data, callback))
                 
             except zmq.error.Again:
-                # Timeout occurred - need to reset the socket
-                self.message_queue.put(('error', 'Request timeout - reconnecting...', None))
-                self.message_queue.put(('reconnect', None, None))
+                # The relaxed socket stays usable after a timeout; only an IPC
+                # connection is replaced, since its socket file may be stale
+                if self.socket_uses_ipc:
+                    self.message_queue.put(('error', 'Request timeout - reconnecting...', None))
+                    self.message_queue.put(('reconnect', None, None))
+                else:
+                    self.message_queue.put(('error', 'Request timeout', None))
             except Exception as e:
                 self.message_queue.put(('error', f'Request failed: {str(e)}', None))
                 # Try to reconnect on any socket error
                 if "cannot be accomplished" in str(e).lower():
                     self.message_queue.put(('reconnect', None, None))
         
-        threading.Thread(target=worker, daemon=True).start()
+        self.requests_in_flight += 1
+        self.request_executor.submit(worker)
+        self.wake_message_processing()
     
     def process_messages(self):
         """Process messages from the queue."""
+        # Drain everything queued since the last tick in one pass
+        messages = []
         try:
-            while not self.message_queue.empty():
-                msg_type, msg_data, callback = self.message_queue.get_nowait()
-                
-                if msg_type == 'response' and callback:
-                    callback(msg_data)
-                elif msg_type == 'error':
-                    self.add_log(msg_data, 'error')
-                elif msg_type == 'reconnect':
-                    self.reconnect()
-                    
+            while True:
+                messages.append(self.message_queue.get_nowait())
         except queue.Empty:
             pass
         
-        self.root.after(100, self.process_messages)
+        processed = bool(messages)
+        needs_reconnect = False
+        
+        for msg_type, msg_data, callback in messages:
+            if msg_type in ('response', 'error'):
+                self.requests_in_flight = max(0, self.requests_in_flight - 1)
+            
+            if msg_type == 'response' and callback:
+                callback(msg_data)
+            elif msg_type == 'error':
+                self.add_log(msg_data, 'error')
+            elif msg_type == 'reconnect':
+                needs_reconnect = True
+            elif msg_type == 'reconnected':
+                self.connected = True
+                self.add_log("Reconnected to service", "success")
+            elif msg_type == 'reconnect_failed':
+                self.connected = False
+                self.add_log(msg_data, "error")
+        
+        # Several failed requests in one tick only need one new socket
+        if needs_reconnect:
+            self.reconnect()
+        
+        # Poll quickly while busy, back off while idle
+        if processed or self.requests_in_flight:
+            self.poll_interval = 10
+        else:
+            self.poll_interval = min(self.poll_interval * 2, 500)
+        
+        self.poll_job = self.root.after(self.poll_interval, self.process_messages)
+    
+    def wake_message_processing(self):
+        """Reschedule queue polling immediately after a request is sent."""
+        if self.poll_job is not None:
+            self.root.after_cancel(self.poll_job)
+        self.poll_interval = 10
+        self.poll_job = self.root.after(self.poll_interval, self.process_messages)
     
     def add_log(self, message, msg_type='info'):
         """Add a message to the current log area."""
@@ -773,16 +879,43 @@ All your data will be permanently deleted.
         except:
             pass
     
-    def exit_app(self):
-        """Exit the application."""
-        if self.session_token:
-            self.logout()
+    def close_connection(self, session_token):
+        """Log out (best effort) and close the sockets (request thread only)."""
+        if session_token and self.socket:
+            try:
+                # Short timeouts so a dead service cannot hold up exit
+                self.socket.setsockopt(zmq.SNDTIMEO, 500)
+                self.socket.setsockopt(zmq.RCVTIMEO, 500)
+                self.socket.send(orjson.dumps({
+                    'action': 'logout',
+                    'session_token': session_token
+                }))
+                self.socket.recv()
+            except zmq.ZMQError:
+                pass
         
         if self.socket:
             self.socket.close()
         
-        if self.context:
-            self.context.term()
+        if self.spare_socket:
+            self.spare_socket.close()
+    
+    def exit_app(self):
+        """Exit the application."""
+        # Teardown runs on the request thread after anything already queued;
+        # only wait briefly so a stuck request cannot freeze the window
+        closed = self.request_executor.submit(self.close_connection, self.session_token)
+        self.request_executor.shutdown(wait=False)
+        
+        try:
+            closed.result(timeout=1.5)
+        except FutureTimeoutError:
+            # Sockets are still open on the request thread; terminating the
+            # context now would block until they close
+            pass
+        else:
+            if self.context:
+                self.context.term()
         
         self.root.quit()
 
@@ -790,7 +923,9 @@ All your data will be permanently deleted.
 def main():
     """Main entry point."""
     root = tk.Tk()
-    app = SecureUsersGUI(root)
+    # IPC is opt-in: --ipc or SECURE_USERS_IPC=1
+    use_ipc = '--ipc' in sys.argv[1:] or bool(os.environ.get('SECURE_USERS_IPC'))
+    app = SecureUsersGUI(root, use_ipc=use_ipc)
     
     def on_closing():
         app.exit_app()
@@ -4,11 +4,15 @@ A ZMQ-based microservice that manages users with authentication and encrypted JS
 """
 
 import zmq
-import json
+import orjson
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime, timedelta
+import atexit
 import os
+import queue
 import sys
+import threading
 import hashlib
 import secrets
 from typing import Dict, List, Optional, Any
@@ -18,13 +22,67 @@ from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.backends import default_backend
 
-# Configure logging
+# Configure logging; records are only enqueued on the calling thread and
+# a background listener formats and writes them
+_log_queue = queue.Queue(-1)
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(
+    logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+)
+_log_listener = QueueListener(_log_queue, _log_stream_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# QueueHandler merges args into the message before enqueueing; keep it
+# message-only so the listener's formatter adds the prefix exactly once
+_log_queue_handler = QueueHandler(_log_queue)
+_log_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+    handlers=[_log_queue_handler]
 )
 logger = logging.getLogger(__name__)
 
+# IPC socket name for same-host clients (formatted with the TCP port); it
+# lives in the user's private runtime directory, see ipc_socket_path()
+IPC_SOCKET_NAME = "secure_users_{port}.sock"
+
+# Lifetime of a login session
+SESSION_DURATION = timedelta(hours=24)
+
+# Fields of the health check response that never change
+HEALTH_STATUS = {'status': 'healthy', 'service': 'Secure Universal Users Service'}
+
+# Reply for requests whose response could not be built or encoded
+INTERNAL_ERROR_RESPONSE = orjson.dumps({
+    'status': 'error',
+    'message': 'Internal server error'
+})
+
+
+def ipc_socket_path(port: int) -> Optional[str]:
+    """
+    Return the IPC socket path for a port inside the user's private runtime directory.
+    
+    Args:
+        port: Service TCP port the socket name is derived from
+        
+    Returns:
+        Socket path, or None if there is no private runtime directory
+    """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if not runtime_dir or sys.platform == 'win32':
+        return None
+    try:
+        info = os.stat(runtime_dir)
+    except OSError:
+        return None
+    # Other local users must not be able to bind or replace the socket
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        return None
+    return os.path.join(runtime_dir, IPC_SOCKET_NAME.format(port=port))
+
 
 class SecureUsersService:
     """
@@ -32,7 +90,8 @@ class SecureUsersService:
     """
     
     def __init__(self, port: int = 5556, storage_file: str = "users_encrypted.json", 
-                 master_password: str = None):
+                 master_password: str = None, ipc_path: Optional[str] = None,
+                 workers: Optional[int] = None):
         """
         Initialize the Secure Users Service.
         
@@ -40,6 +99,8 @@ class SecureUsersService:
             port: Port number for ZMQ socket
             storage_file: Path to encrypted JSON storage file
             master_password: Master password for encryption (will prompt if not provided)
+            ipc_path: Optional IPC socket path to bind alongside the TCP port
+            workers: Number of request worker threads (defaults to half the CPUs, min 2)
         """
         self.port = port
         self.storage_file = storage_file
@@ -51,13 +112,61 @@ class SecureUsersService:
         self.cipher_suite = self._initialize_encryption(master_password)
         
         # Initialize ZMQ
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REP)
+        self.context = zmq.Context(io_threads=2)
+        # Frontend ROUTER; run() proxies it to a pool of REP worker threads.
+        # REQ clients are unaffected
+        self.socket = self.context.socket(zmq.ROUTER)
+        self.socket.setsockopt(zmq.RCVHWM, 10000)
+        self.socket.setsockopt(zmq.SNDHWM, 10000)
+        self.socket.setsockopt(zmq.TCP_KEEPALIVE, 1)
+        self.socket.setsockopt(zmq.LINGER, 0)
         self.socket.bind(f"tcp://*:{port}")
         
+        # Local clients can skip the TCP stack through an IPC endpoint
+        self.ipc_path = ipc_path
+        if ipc_path:
+            self.socket.bind(f"ipc://{ipc_path}")
+        
+        # Worker pool; the user database and sessions are shared between
+        # workers, so request handling is serialized by this lock
+        if workers is None:
+            workers = max(2, (os.cpu_count() or 2) // 2)
+        self.workers = workers
+        self.backend_endpoint = f"inproc://secure_users_workers_{id(self)}"
+        self.backend = None
+        self._lock = threading.RLock()
+        
+        # Pre-encoded health check envelope; only the timestamp and session
+        # count change between responses
+        self._health_prefix = (
+            orjson.dumps(HEALTH_STATUS)[:-1] + b',"timestamp":'
+        )
+        self._health_middle = (
+            b',"storage":' + orjson.dumps(os.path.abspath(storage_file)) +
+            b',"active_sessions":'
+        )
+        
         # Session management (in production, use Redis or similar)
         self.sessions = {}  # session_token -> {username, expires_at}
         
+        # Action dispatch table used by process_request
+        self._handlers = {
+            'create_user': lambda r: self.create_user(r.get('user_data', {})),
+            'login': lambda r: self.login(r.get('credentials', {})),
+            'logout': lambda r: self.logout(r.get('session_token', '')),
+            'get_user': lambda r: self.get_user(r.get('session_token', '')),
+            'update_user': lambda r: self.update_user(
+                r.get('session_token', ''),
+                r.get('update_data', {})
+            ),
+            'delete_user': lambda r: self.delete_user(
+                r.get('session_token', ''),
+                r.get('password', '')
+            ),
+            'list_users': lambda r: self.list_users(r.get('session_token')),
+            'health_check': lambda r: self.health_check(),
+        }
+        
         # Load existing users
         self.users_db = self._load_users()
         
@@ -65,8 +174,15 @@ class SecureUsersService:
         if not self.users_db:
             self._create_default_admin()
         
+        # Email -> username index so email lookups do not scan every user
+        self.email_index = {}
+        for user in self.users_db.values():
+            self.email_index.setdefault(user['email'], user['username'])
+        
         logger.info(f"Secure Users Service started on port {port}")
         logger.info(f"Storage: {os.path.abspath(storage_file)}")
+        if ipc_path:
+            logger.info(f"IPC endpoint: ipc://{ipc_path}")
     
     def _initialize_encryption(self, master_password: str) -> Fernet:
         """
@@ -105,7 +221,7 @@ class SecureUsersService:
             
             if encrypted_data:
                 decrypted_data = self.cipher_suite.decrypt(encrypted_data)
-                users = json.loads(decrypted_data.decode())
+                users = orjson.loads(decrypted_data)
                 logger.info(f"Loaded {len(users)} users from encrypted storage")
                 return users
             else:
@@ -119,8 +235,8 @@ class SecureUsersService:
     def _save_users(self):
         """Save users to encrypted JSON file."""
         try:
-            json_data = json.dumps(self.users_db, indent=2)
-            encrypted_data = self.cipher_suite.encrypt(json_data.encode())
+            json_data = orjson.dumps(self.users_db)
+            encrypted_data = self.cipher_suite.encrypt(json_data)
             
             # Write atomically
             temp_file = f"{self.storage_file}.tmp"
@@ -136,6 +252,23 @@ class SecureUsersService:
             logger.error(f"Error saving users: {e}")
             raise
     
+    def _is_storable(self, data: Dict[str, Any]) -> bool:
+        """
+        Check that request fields can be written to encrypted storage.
+        
+        Args:
+            data: Fields that will be copied into a user record
+            
+        Returns:
+            True if the fields encode at the depth they are stored at
+        """
+        try:
+            # Records sit one level down in users_db, so wrap once to match
+            orjson.dumps({'': data})
+            return True
+        except orjson.JSONEncodeError:
+            return False
+    
     def _hash_password(self, password: str, salt: str = None) -> tuple:
         """
         Hash a password with salt.
@@ -182,6 +315,7 @@ class SecureUsersService:
     def _create_default_admin(self):
         """Create a default admin user if database is empty."""
         admin_password_hash, admin_salt = self._hash_password("admin123")
+        now = datetime.now().isoformat()
         
         self.users_db["admin"] = {
             "username": "admin",
@@ -191,8 +325,8 @@ class SecureUsersService:
             "full_name": "System Administrator",
             "role": "admin",
             "status": "active",
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat(),
+            "created_at": now,
+            "updated_at": now,
             "last_login": None,
             "metadata": {}
         }
@@ -211,6 +345,13 @@ class SecureUsersService:
             Response dictionary
         """
         try:
+            # Reject values the store cannot encode before touching users_db
+            if not self._is_storable(user_data):
+                return {
+                    'status': 'error',
+                    'message': 'User data cannot be stored'
+                }
+            
             # Required fields validation
             username = user_data.get('username', '').strip().lower()
             email = user_data.get('email', '').strip().lower()
@@ -237,12 +378,11 @@ class SecureUsersService:
                 }
             
             # Check if email already exists
-            for user in self.users_db.values():
-                if user['email'] == email:
-                    return {
-                        'status': 'error',
-                        'message': 'Email already registered'
-                    }
+            if email in self.email_index:
+                return {
+                    'status': 'error',
+                    'message': 'Email already registered'
+                }
             
             # Hash password
             password_hash, salt = self._hash_password(password)
@@ -269,6 +409,7 @@ class SecureUsersService:
                 "notes": user_data.get('notes', ''),
                 "metadata": user_data.get('metadata', {})
             }
+            self.email_index[email] = username
             
             # Save to encrypted storage
             self._save_users()
@@ -310,15 +451,12 @@ class SecureUsersService:
                 }
             
             # Find user by username or email
-            user = None
-            if identifier in self.users_db:
-                user = self.users_db[identifier]
-            else:
+            user = self.users_db.get(identifier)
+            if user is None:
                 # Try to find by email
-                for u in self.users_db.values():
-                    if u['email'] == identifier:
-                        user = u
-                        break
+                owner = self.email_index.get(identifier)
+                if owner is not None:
+                    user = self.users_db.get(owner)
             
             if not user:
                 return {
@@ -341,16 +479,17 @@ class SecureUsersService:
                 }
             
             # Create session
+            now = datetime.now()
             session_token = self._generate_session_token()
-            expires_at = datetime.now() + timedelta(hours=24)
+            expires_at = now + SESSION_DURATION
             
             self.sessions[session_token] = {
                 'username': user['username'],
-                'expires_at': expires_at.isoformat()
+                'expires_at': expires_at
             }
             
             # Update last login
-            user['last_login'] = datetime.now().isoformat()
+            user['last_login'] = now.isoformat()
             self._save_users()
             
             logger.info(f"User logged in: {user['username']}")
@@ -411,9 +550,7 @@ class SecureUsersService:
             return None
         
         session = self.sessions[session_token]
-        expires_at = datetime.fromisoformat(session['expires_at'])
-        
-        if datetime.now() > expires_at:
+        if datetime.now() > session['expires_at']:
             del self.sessions[session_token]
             return None
         
@@ -439,6 +576,13 @@ class SecureUsersService:
                     'message': 'Invalid or expired session'
                 }
             
+            # Reject values the store cannot encode before touching users_db
+            if not self._is_storable(update_data):
+                return {
+                    'status': 'error',
+                    'message': 'Update data cannot be stored'
+                }
+            
             user = self.users_db[username]
             
             # Handle username change
@@ -454,6 +598,8 @@ class SecureUsersService:
                 self.users_db[new_username] = self.users_db.pop(username)
                 user = self.users_db[new_username]
                 user['username'] = new_username
+                if self.email_index.get(user['email']) == username:
+                    self.email_index[user['email']] = new_username
                 
                 # Update session
                 self.sessions[session_token]['username'] = new_username
@@ -463,12 +609,15 @@ class SecureUsersService:
             new_email = update_data.get('email', '').strip().lower()
             if new_email and new_email != user['email']:
                 # Check if email already exists
-                for u in self.users_db.values():
-                    if u['email'] == new_email and u['username'] != username:
-                        return {
-                            'status': 'error',
-                            'message': 'Email already registered'
-                        }
+                owner = self.email_index.get(new_email)
+                if owner is not None and owner != username:
+                    return {
+                        'status': 'error',
+                        'message': 'Email already registered'
+                    }
+                if self.email_index.get(user['email']) == username:
+                    del self.email_index[user['email']]
+                self.email_index[new_email] = username
                 user['email'] = new_email
             
             # Handle password change
@@ -598,6 +747,8 @@ class SecureUsersService:
             
             # Remove user
             del self.users_db[username]
+            if self.email_index.get(user['email']) == username:
+                del self.email_index[user['email']]
             
             # Invalidate session
             del self.sessions[session_token]
@@ -670,90 +821,174 @@ class SecureUsersService:
         """
         action = request_data.get('action')
         
-        if action == 'create_user':
-            return self.create_user(request_data.get('user_data', {}))
-        
-        elif action == 'login':
-            return self.login(request_data.get('credentials', {}))
+        handler = self._handlers.get(action) if isinstance(action, str) else None
+        if handler is None:
+            return {
+                'status': 'error',
+                'message': f"Unknown action: {action}"
+            }
         
-        elif action == 'logout':
-            return self.logout(request_data.get('session_token', ''))
+        return handler(request_data)
+    
+    def health_check(self) -> Dict[str, Any]:
+        """
+        Report service status.
         
-        elif action == 'get_user':
-            return self.get_user(request_data.get('session_token', ''))
+        Returns:
+            Health status dictionary
+        """
+        return {
+            **HEALTH_STATUS,
+            'timestamp': datetime.now().isoformat(),
+            'storage': os.path.abspath(self.storage_file),
+            'active_sessions': len(self.sessions)
+        }
+    
+    def _handle_message(self, message: bytes) -> bytes:
+        """
+        Decode one raw request, process it, and encode the response.
         
-        elif action == 'update_user':
-            return self.update_user(
-                request_data.get('session_token', ''),
-                request_data.get('update_data', {})
-            )
+        Args:
+            message: Raw JSON request payload
+            
+        Returns:
+            Raw JSON response payload
+        """
+        log = logger.info if logger.isEnabledFor(logging.INFO) else None
+        if log:
+            log("Received request (%d bytes)", len(message))
         
-        elif action == 'delete_user':
-            return self.delete_user(
-                request_data.get('session_token', ''),
-                request_data.get('password', '')
-            )
+        try:
+            # Parse JSON request
+            request_data = orjson.loads(message)
+            
+            # Process request
+            if isinstance(request_data, dict):
+                if request_data.get('action') == 'health_check':
+                    response_json = self._encode_health_check()
+                    if log:
+                        log("Sent response (%d bytes)", len(response_json))
+                    return response_json
+                try:
+                    with self._lock:
+                        response = self.process_request(request_data)
+                except Exception as e:
+                    # Always reply, or the REP worker that owns this request
+                    # is left unable to serve anything else
+                    logger.exception(f"Error processing request: {e}")
+                    response = {
+                        'status': 'error',
+                        'message': 'Internal server error'
+                    }
+            else:
+                response = {
+                    'status': 'error',
+                    'message': 'Request must be a JSON object'
+                }
+            
+        except orjson.JSONDecodeError as e:
+            logger.error(f"Invalid JSON received: {e}")
+            response = {
+                'status': 'error',
+                'message': 'Invalid JSON format'
+            }
         
-        elif action == 'list_users':
-            return self.list_users(request_data.get('session_token'))
+        try:
+            response_json = orjson.dumps(response)
+        except orjson.JSONEncodeError as e:
+            logger.error(f"Error encoding response: {e}")
+            response_json = INTERNAL_ERROR_RESPONSE
+        if log:
+            log("Sent response (%d bytes)", len(response_json))
+        return response_json
+    
+    def _encode_health_check(self) -> bytes:
+        """Build the health check response bytes without a full JSON encode."""
+        return (
+            self._health_prefix + orjson.dumps(datetime.now()) +
+            self._health_middle + str(len(self.sessions)).encode() + b'}'
+        )
+    
+    def _worker_loop(self):
+        """Serve requests handed out by the backend DEALER until shutdown."""
+        socket = self.context.socket(zmq.REP)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self.backend_endpoint)
         
-        elif action == 'health_check':
-            return {
-                'status': 'healthy',
-                'service': 'Secure Universal Users Service',
-                'timestamp': datetime.now().isoformat(),
-                'storage': os.path.abspath(self.storage_file),
-                'active_sessions': len(self.sessions)
-            }
+        # Bind hot-loop lookups to locals
+        recv = socket.recv
+        send = socket.send
+        handle_message = self._handle_message
         
-        else:
-            return {
-                'status': 'error',
-                'message': f"Unknown action: {action}"
-            }
+        try:
+            while True:
+                message = recv()
+                try:
+                    reply = handle_message(message)
+                except Exception as e:
+                    # A REP socket must answer before it can receive again;
+                    # never let one bad request take the worker down
+                    logger.exception(f"Error handling message: {e}")
+                    reply = INTERNAL_ERROR_RESPONSE
+                send(reply)
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            socket.close()
     
     def run(self):
         """Run the service main loop."""
         logger.info("Secure Users Service is ready to accept requests...")
         logger.info("Default admin credentials: username=admin, password=admin123")
         
+        # Backend DEALER load-balances requests across the worker threads
+        self.backend = self.context.socket(zmq.DEALER)
+        self.backend.setsockopt(zmq.LINGER, 0)
+        self.backend.bind(self.backend_endpoint)
+        
+        for i in range(self.workers):
+            threading.Thread(
+                target=self._worker_loop,
+                name=f"users-worker-{i}",
+                daemon=True
+            ).start()
+        logger.info(f"Started {self.workers} worker threads")
+        
         try:
-            while True:
-                # Wait for request
-                message = self.socket.recv_string()
-                logger.info(f"Received request: {message[:100]}...")
-                
-                try:
-                    # Parse JSON request
-                    request_data = json.loads(message)
-                    
-                    # Process request
-                    response = self.process_request(request_data)
-                    
-                except json.JSONDecodeError as e:
-                    logger.error(f"Invalid JSON received: {e}")
-                    response = {
-                        'status': 'error',
-                        'message': 'Invalid JSON format'
-                    }
-                
-                # Send response
-                response_json = json.dumps(response)
-                self.socket.send_string(response_json)
-                logger.info(f"Sent response: {response_json[:100]}...")
-                
+            zmq.proxy(self.socket, self.backend)
         except KeyboardInterrupt:
             logger.info("Shutting down Secure Users Service...")
+        except zmq.ContextTerminated:
+            pass
         finally:
             self.cleanup()
     
     def cleanup(self):
         """Clean up resources."""
-        # Save any pending changes
-        self._save_users()
+        # Save any pending changes; a failed save must not keep the sockets
+        # and context alive
+        try:
+            with self._lock:
+                self._save_users()
+        except Exception:
+            pass
         
         self.socket.close()
+        if self.backend:
+            self.backend.close()
+        
+        # Terminating the context also stops the worker threads
         self.context.term()
+        
+        # Don't leave a dead socket file behind for the next run
+        if self.ipc_path:
+            try:
+                os.remove(self.ipc_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Error removing IPC socket {self.ipc_path}: {e}")
+        
         logger.info("Secure Users Service shutdown complete")
 
 
@@ -762,18 +997,29 @@ def main():
     port = 5556
     storage_file = "users_encrypted.json"
     
-    if len(sys.argv) > 1:
+    # IPC is opt-in: --ipc or SECURE_USERS_IPC=1
+    use_ipc = '--ipc' in sys.argv[1:] or bool(os.environ.get('SECURE_USERS_IPC'))
+    args = [arg for arg in sys.argv[1:] if arg != '--ipc']
+    
+    if len(args) > 0:
         try:
-            port = int(sys.argv[1])
+            port = int(args[0])
         except ValueError:
-            logger.error(f"Invalid port number: {sys.argv[1]}")
+            logger.error(f"Invalid port number: {args[0]}")
             sys.exit(1)
     
-    if len(sys.argv) > 2:
-        storage_file = sys.argv[2]
+    if len(args) > 1:
+        storage_file = args[1]
+    
+    ipc_path = None
+    if use_ipc:
+        ipc_path = ipc_socket_path(port)
+        if ipc_path is None:
+            logger.warning("IPC requested but XDG_RUNTIME_DIR is not a private "
+                           "directory; serving over TCP only")
     
     # Create and run the service
-    service = SecureUsersService(port=port, storage_file=storage_file)
+    service = SecureUsersService(port=port, storage_file=storage_file, ipc_path=ipc_path)
     service.run()
 
 